@@ -1,62 +1,181 @@
-import csv
+import mmap
 import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.compute as pc
 
 class LondonFilter:
     """
     Reads all 'pp-<year>.csv' files in a directory, keeps only rows
     where the town/city field is exactly 'LONDON' (case‑insensitive),
     and appends them into a single 'london.csv' output file.
-    
+
     Assumes files are comma-delimited, no header row,
     with fields in the expected 16-column order:
     (transaction_id, price, transfer_date, postcode, property_type, old_new,
      duration, paon, saon, street, locality, town, district, county,
      ppd_category, record_status)
     """
-    COLUMN_COUNT = 16
+    COLUMNS = [
+        "transaction_id", "price", "transfer_date", "postcode", "property_type",
+        "old_new", "duration", "paon", "saon", "street",
+        "locality", "town", "district", "county", "ppd_category", "record_status"
+    ]
     TOWN_IDX = 11  # zero-based index: 12th column is Town/City
+    BLOCK_SIZE = 64 * 1024 * 1024  # bytes parsed per Arrow batch
+    WRITE_BATCH_ROWS = 10_000  # matched rows accumulated before each write
+    WRITE_BUFFER_SIZE = 1024 * 1024  # bytes buffered on the output file
+    # Any field equal to LONDON; a cheap superset of the Town/City check
+    LONDON_FIELD = re.compile(rb',"?[ \t]*LONDON[ \t]*"?,', re.IGNORECASE)
 
-    def __init__(self, input_dir, output_path="london.csv"):
+    def __init__(self, input_dir, output_path="london.csv", max_workers=None):
         """
         :param input_dir: directory containing pp-{year}.csv files
         :param output_path: filepath for merged output (defaults to london.csv)
+        :param max_workers: processes used to filter files in parallel (defaults to CPU count)
         """
         self.input_dir = input_dir
         self.output_path = output_path
+        self.max_workers = max_workers
+        # Keep every field as text so values are written back exactly as read
+        self.schema = pa.schema([(name, pa.string()) for name in self.COLUMNS])
+
+    def _london_mask(self, batch):
+        """
+        Boolean mask of rows whose Town/City column is 'LONDON' (case-insensitive).
+        """
+        town = pc.utf8_upper(pc.utf8_trim_whitespace(batch.column(self.TOWN_IDX)))
+        return pc.equal(town, "LONDON")
+
+    def _candidate_lines(self, path):
+        """
+        Memory-map a file and return only the lines that contain a LONDON field.
+
+        Most national rows are not London, so scanning the raw bytes first means
+        only a small fraction of each file reaches the CSV parser. Lines are cut on
+        raw newlines, so a candidate with an odd number of quote characters means a
+        quoted field spans lines; None is returned and the caller parses the whole file.
+        """
+        if os.path.getsize(path) == 0:
+            return b""
+        lines = []
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            line_end = -1
+            for match in self.LONDON_FIELD.finditer(mm):
+                if match.start() < line_end:
+                    continue  # another LONDON field on a line already kept
+                line_start = mm.rfind(b"\n", 0, match.start()) + 1
+                line_end = mm.find(b"\n", match.end())
+                if line_end == -1:
+                    line_end = len(mm)
+                line = mm[line_start:line_end]
+                if line.count(b'"') % 2:
+                    return None
+                lines.append(line)
+        return b"\n".join(lines) + b"\n" if lines else b""
+
+    def _open_reader(self, source, newlines_in_values=False):
+        """
+        Open a streaming Arrow CSV reader over headerless pp-<year>.csv bytes, or a file path.
+        """
+        if isinstance(source, bytes):
+            source = pa.BufferReader(source)
+        return pv.open_csv(
+            source,
+            read_options=pv.ReadOptions(column_names=self.COLUMNS, block_size=self.BLOCK_SIZE),
+            # Skip any row with unexpected column count
+            parse_options=pv.ParseOptions(
+                delimiter=",",
+                newlines_in_values=newlines_in_values,
+                invalid_row_handler=lambda row: "skip"
+            ),
+            convert_options=pv.ConvertOptions(column_types=self.schema),
+        )
 
-    def _is_london(self, row):
+    def _filter_file(self, path, out_path):
         """
-        Check if the row's Town/City column is 'LONDON' (case-insensitive).
+        Filter London rows of one pp-<year>.csv into a headerless CSV at out_path.
+        Runs in a worker process, so it only touches its own input and output.
         """
-        return len(row) >= self.TOWN_IDX + 1 and row[self.TOWN_IDX].strip().upper() == "LONDON"
+        write_options = pv.WriteOptions(include_header=False, quoting_style="needed")
+        with open(out_path, "wb", buffering=self.WRITE_BUFFER_SIZE) as out_f, \
+                pv.CSVWriter(out_f, self.schema, write_options=write_options) as writer:
+            candidates = self._candidate_lines(path)
+            if candidates is None:
+                # Quoted fields with embedded newlines: parse the full file instead
+                reader = self._open_reader(path, newlines_in_values=True)
+            elif candidates:
+                reader = self._open_reader(candidates)
+            else:
+                return out_path
+            pending, pending_rows = [], 0
+
+            # Every parsed row still gets the definitive Town/City check
+            for batch in reader:
+                filtered = batch.filter(self._london_mask(batch))
+                if filtered.num_rows:
+                    pending.append(filtered)
+                    pending_rows += filtered.num_rows
+                # Coalesce small batches so each write is a large sequential chunk
+                if pending_rows >= self.WRITE_BATCH_ROWS:
+                    writer.write_table(pa.Table.from_batches(pending, schema=self.schema))
+                    pending, pending_rows = [], 0
+
+            if pending:
+                writer.write_table(pa.Table.from_batches(pending, schema=self.schema))
+        return out_path
 
     def process(self):
         """
-        Iterate through input files, filter London rows, and write to output file.
-        """
-        # Open output once and write as CSV
-        with open(self.output_path, "w", newline="", encoding="utf-8") as out_f:
-            writer = csv.writer(out_f)
-            # Optionally write a header row if desired:
-            header = [
-                "transaction_id", "price", "transfer_date", "postcode", "property_type",
-                "old_new", "duration", "paon", "saon", "street",
-                "locality", "town", "district", "county", "ppd_category", "record_status"
-            ]
-            writer.writerow(header)
-
-            # Loop through all files named pp-<year>.csv
-            for fname in sorted(os.listdir(self.input_dir)):
-                if not fname.lower().startswith("pp-") or not fname.lower().endswith(".csv"):
-                    continue
-                path = os.path.join(self.input_dir, fname)
-                with open(path, newline="", encoding="utf-8") as in_f:
-                    reader = csv.reader(in_f)
-                    for row in reader:
-                        # Skip any row with unexpected column count
-                        if len(row) != self.COLUMN_COUNT:
-                            continue
-                        if self._is_london(row):
-                            writer.writerow(row)
+        Filter every input file in parallel, then merge the results into the output file.
+        """
+        # Loop through all files named pp-<year>.csv
+        paths = [
+            os.path.join(self.input_dir, fname)
+            for fname in sorted(os.listdir(self.input_dir))
+            if fname.lower().startswith("pp-") and fname.lower().endswith(".csv")
+        ]
+
+        # Per-file results go to a temp dir next to the output so the final copy stays on one disk
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(self.output_path)))
+        try:
+            tmp_paths = [os.path.join(tmp_dir, f"{i}.csv") for i in range(len(paths))]
+            if paths:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    # map preserves input order, so the merged output is sorted by file name
+                    tmp_paths = list(executor.map(self._filter_file, paths, tmp_paths))
+
+            # Write the header once, then append each file's rows
+            with open(self.output_path, "wb", buffering=self.WRITE_BUFFER_SIZE) as out_f:
+                out_f.write((",".join(self.COLUMNS) + "\n").encode("utf-8"))
+                for tmp_path in tmp_paths:
+                    with open(tmp_path, "rb") as in_f:
+                        shutil.copyfileobj(in_f, out_f, self.WRITE_BUFFER_SIZE)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
         print(f"Filtered London data saved to: {self.output_path}")
+
+
+def load_london_csv(path):
+    """
+    Load the filtered london.csv into pandas with pyarrow-backed dtypes.
+
+    Parsing uses the multithreaded pyarrow engine and text columns such as
+    postcode and town stay as Arrow strings, which are smaller and faster to
+    hash than object columns. transfer_date is returned as datetime64[ns] so
+    the usual .dt accessors and numpy date arithmetic keep working.
+
+    :param path: filepath of the london.csv written by LondonFilter
+    :return: DataFrame with one row per London transaction
+    """
+    df = pd.read_csv(path, engine="pyarrow", dtype_backend="pyarrow", parse_dates=["transfer_date"])
+    for col in ("postcode", "town"):
+        df[col] = df[col].astype("string[pyarrow]")
+    df["transfer_date"] = df["transfer_date"].astype("datetime64[ns]")
+    return df
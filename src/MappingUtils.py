@@ -1,11 +1,139 @@
+from functools import lru_cache
 import numpy as np
-from shapely.geometry import Polygon
+import pandas as pd
+import datashader as ds
+from numba import njit, prange
+from shapely import from_ragged_array, GeometryType
 import geopandas as gpd
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from matplotlib.colors import TwoSlopeNorm
 from matplotlib.colors import Normalize
 
+def align_to(gdf, target_crs):
+    """
+    Return gdf in target_crs, reprojecting only if the CRS differs.
+
+    Parameters:
+        gdf (GeoDataFrame): Input GeoDataFrame.
+        target_crs: CRS to align to (e.g. hexgrid.crs).
+
+    Returns:
+        GeoDataFrame: gdf itself if already in target_crs, otherwise a reprojected copy.
+    """
+    return gdf if gdf.crs == target_crs else gdf.to_crs(target_crs)
+
+
+@lru_cache(maxsize=None)
+def _load_boroughs(boroughs_path, crs_wkt):
+    """
+    Read the borough shapefile and project it to the given CRS, once per (path, CRS).
+    The cached GeoDataFrame is shared between calls and must not be modified.
+    """
+    return gpd.read_file(boroughs_path).to_crs(crs_wkt)
+
+
+@lru_cache(maxsize=None)
+def _load_boroughs_union(boroughs_path, crs_wkt):
+    """
+    Single dissolved geometry of all boroughs, used as the clipping mask.
+    """
+    return _load_boroughs(boroughs_path, crs_wkt).union_all()
+
+
+@lru_cache(maxsize=None)
+def _borough_labels(boroughs_path, crs_wkt):
+    """
+    (x, y, name) for each borough label, from one vectorised centroid computation.
+    """
+    boroughs = _load_boroughs(boroughs_path, crs_wkt)
+    centroids = boroughs.geometry.centroid
+    return list(zip(centroids.x.to_numpy(), centroids.y.to_numpy(), boroughs["BOROUGH"].to_numpy()))
+
+
+def _join_to_hexgrid(gdf, hexgrid, columns):
+    """
+    Match each point in gdf to the hex containing it, using the hexgrid's spatial index.
+
+    hexgrid.sindex is built once and cached on the grid, so repeated plots on the
+    same hexgrid reuse the tree instead of rebuilding it inside every sjoin.
+
+    Returns:
+        DataFrame: 'index_right' (hexgrid index label) plus the requested columns.
+    """
+    point_idx, hex_idx = hexgrid.sindex.query(gdf.geometry.values, predicate="within")
+    joined = pd.DataFrame({"index_right": hexgrid.index.to_numpy()[hex_idx]})
+    for col in columns:
+        joined[col] = gdf[col].to_numpy()[point_idx]
+    return joined
+
+
+@njit(parallel=True, cache=True)
+def _fill_hex_coords(cx, cy, size, out):
+    """
+    Write the 7 ring vertices (6 corners + closing repeat) of each hex centred at
+    (cx[i], cy[i]) into out[i], an (n_hex, 7, 2) buffer.
+    """
+    x_off = np.empty(7)
+    y_off = np.empty(7)
+    for k in range(7):
+        angle = (k % 6) * (np.pi / 3)
+        x_off[k] = size * np.cos(angle)
+        y_off[k] = size * np.sin(angle)
+    for i in prange(cx.shape[0]):
+        for k in range(7):
+            out[i, k, 0] = cx[i] + x_off[k]
+            out[i, k, 1] = cy[i] + y_off[k]
+
+
+@njit(parallel=True, cache=True)
+def _pct_delta(base, target, out):
+    """
+    out[i] = % change from base[i] to target[i], or NaN where base[i] is 0.
+    """
+    for i in prange(base.shape[0]):
+        if base[i] > 0:
+            out[i] = 100.0 * (float(target[i]) - float(base[i])) / float(base[i])
+        else:
+            out[i] = np.nan
+
+
+def _rasterize_hexes(ax, hexes, value_col, bounds, cmap, norm=None, plot_width=1200):
+    """
+    Aggregate hex polygons onto a pixel grid with datashader and draw it with imshow.
+
+    Rendering one image instead of a matplotlib patch per hex keeps plotting time
+    flat as hex_size shrinks. Pixels outside any hex (or summing to 0) are left blank.
+
+    Returns:
+        AxesImage: The drawn image, usable as a colorbar mappable, or None if
+        there are no polygon hexes to draw.
+    """
+    # datashader only rasterises polygons; gpd.clip can leave edge/point slivers
+    hexes = hexes[hexes.geom_type.isin(["Polygon", "MultiPolygon"])]
+    if hexes.empty:
+        return None
+
+    minx, miny, maxx, maxy = bounds
+    plot_height = max(1, int(round(plot_width * (maxy - miny) / (maxx - minx))))
+    canvas = ds.Canvas(
+        plot_width=plot_width,
+        plot_height=plot_height,
+        x_range=(minx, maxx),
+        y_range=(miny, maxy)
+    )
+    agg = canvas.polygons(hexes, geometry=hexes.geometry.name, agg=ds.sum(value_col)).to_numpy()
+    image = np.ma.masked_where(~np.isfinite(agg) | (agg == 0), agg)
+    return ax.imshow(
+        image,
+        cmap=cmap,
+        norm=norm,
+        extent=[minx, maxx, miny, maxy],
+        origin="lower",
+        interpolation="nearest"
+    )
+
+
 def add_transaction_columns_to_gdf(gdf, london_df, postcode_column='postcode'):
     """
     Adds yearly transaction count columns and a % change column (transactions_delta) to gdf.
@@ -19,31 +147,41 @@ def add_transaction_columns_to_gdf(gdf, london_df, postcode_column='postcode'):
         GeoDataFrame: gdf with transaction columns and a 'transactions_delta' column.
     """
     gdf = gdf.copy()
-    years = sorted(london_df['year'].unique())
 
-    for year in years:
-        col_name = f"transactions_{year}"
-        counts = (
-            london_df[london_df['year'] == year]
-            .groupby(postcode_column)
-            .size()
-            .reset_index(name=col_name)
-        )
-        gdf = gdf.merge(counts, on=postcode_column, how='left')
+    # Encode postcodes against shared categories so counting works on integer codes
+    categories = pd.Index(
+        pd.concat([gdf[postcode_column], london_df[postcode_column]]).dropna().unique()
+    )
+    gdf_codes = pd.Categorical(gdf[postcode_column], categories=categories).codes
+    pc_codes = pd.Categorical(london_df[postcode_column], categories=categories).codes
+    yr_codes, years = pd.factorize(london_df['year'], sort=True)
+
+    # Count transactions per (postcode, year) in one bincount: shape (n_postcodes, n_years)
+    n_postcodes, n_years = len(categories), len(years)
+    valid = (pc_codes >= 0) & (yr_codes >= 0)
+    flat = pc_codes[valid].astype(np.int64) * n_years + yr_codes[valid]
+    counts = np.bincount(flat, minlength=n_postcodes * n_years).reshape(n_postcodes, n_years)
+
+    # Smallest unsigned int that fits the counts; the extra zero row is picked up
+    # by code -1, i.e. gdf rows whose postcode is missing
+    dtype = np.min_scalar_type(int(counts.max(initial=0)))
+    counts = np.vstack([counts, np.zeros((1, n_years), dtype=counts.dtype)]).astype(dtype)
+    gdf_counts = counts[gdf_codes]
 
-    # Fill NaNs and convert to int
     trans_cols = [f"transactions_{y}" for y in years]
-    gdf[trans_cols] = gdf[trans_cols].fillna(0).astype(int)
+    gdf[trans_cols] = gdf_counts
 
     # Compute percentage change from 2018 to 2024
-    if 'transactions_2018' in gdf.columns and 'transactions_2024' in gdf.columns:
-        gdf["transactions_delta"] = np.where(
-            gdf["transactions_2018"] > 0,
-            100 * (gdf["transactions_2024"] - gdf["transactions_2018"]) / gdf["transactions_2018"],
-            np.nan  # or 0 if preferred
+    if 'transactions_2018' in trans_cols and 'transactions_2024' in trans_cols:
+        delta = np.empty(len(gdf), dtype=np.float32)
+        _pct_delta(
+            np.ascontiguousarray(gdf_counts[:, trans_cols.index('transactions_2018')]),
+            np.ascontiguousarray(gdf_counts[:, trans_cols.index('transactions_2024')]),
+            delta
         )
+        gdf["transactions_delta"] = delta
     else:
-        gdf["transactions_delta"] = np.nan
+        gdf["transactions_delta"] = np.float32(np.nan)
 
     return gdf
 
@@ -70,22 +208,26 @@ def generate_hexgrid(gdf, hex_size=1000):
     cols = int((maxx - minx) / dx) + 2
     rows = int((maxy - miny) / dy) + 2
 
-    # Function to create hexagon at (x, y)
-    def create_hexagon(x, y, size):
-        angles = np.linspace(0, 2 * np.pi, 7)[:-1]
-        return Polygon([
-            (x + size * np.cos(a), y + size * np.sin(a)) for a in angles
-        ])
-
-    # Generate hexes
-    hexes = []
-    for col in range(cols):
-        for row in range(rows):
-            x = minx + col * dx
-            y = miny + row * dy
-            if col % 2 == 1:  # Stagger odd columns
-                y += dy / 2
-            hexes.append(create_hexagon(x, y, hex_size))
+    # Hex centres for every (col, row), ordered column by column
+    x = minx + np.arange(cols) * dx
+    y = miny + np.arange(rows) * dy
+    cx, cy = np.meshgrid(x, y, indexing="ij")
+    cy[1::2, :] += dy / 2  # Stagger odd columns
+
+    # Fill the 7 ring vertices (6 corners + closing repeat of the first) of every
+    # hex into one flat (cols*rows*7, 2) coordinate buffer
+    n_hex = cols * rows
+    coords = np.empty((n_hex, 7, 2))
+    _fill_hex_coords(cx.ravel(), cy.ravel(), float(hex_size), coords)
+
+    # Build all hexes straight from the buffer: one ring of 7 coords per polygon
+    ring_offsets = np.arange(0, n_hex * 7 + 1, 7)
+    polygon_offsets = np.arange(n_hex + 1)
+    hexes = from_ragged_array(
+        GeometryType.POLYGON,
+        coords.reshape(-1, 2),
+        offsets=(ring_offsets, polygon_offsets)
+    )
 
     # Return as GeoDataFrame
     return gpd.GeoDataFrame(geometry=hexes, crs=gdf.crs)
@@ -122,8 +264,9 @@ def plot_transaction_heatmap(
         value_col = f"transactions_{year}"
         gdf_filtered = gdf[gdf[value_col] > 0]
 
-    # Spatial join
-    joined = gpd.sjoin(gdf_filtered, hexgrid, how="left", predicate="within")
+    # Spatial join (points must share the hexgrid CRS)
+    gdf_filtered = align_to(gdf_filtered, hexgrid.crs)
+    joined = _join_to_hexgrid(gdf_filtered, hexgrid, [value_col])
     agg = joined.groupby("index_right")[value_col].mean()
 
     # Map to hexgrid
@@ -132,8 +275,9 @@ def plot_transaction_heatmap(
     hexgrid["transactions_sum"] = hexgrid["transactions_sum"].fillna(0)
 
     # Load boroughs and clip
-    boroughs = gpd.read_file(boroughs_path).to_crs(hexgrid.crs)
-    hexgrid_clipped = gpd.clip(hexgrid, boroughs)
+    crs_wkt = hexgrid.crs.to_wkt()
+    boroughs = _load_boroughs(boroughs_path, crs_wkt)
+    hexgrid_clipped = gpd.clip(hexgrid, _load_boroughs_union(boroughs_path, crs_wkt))
 
     hex_zero = hexgrid_clipped[hexgrid_clipped["transactions_sum"] == 0]
     hex_nonzero = hexgrid_clipped[hexgrid_clipped["transactions_sum"] != 0]
@@ -156,32 +300,32 @@ def plot_transaction_heatmap(
         cmap = 'RdBu_r'
         vmin = hex_nonzero["transactions_sum"].min()
         vmax = hex_nonzero["transactions_sum"].max()
-        abs_max = max(abs(vmin), abs(vmax))
+        abs_max = max(abs(vmin), abs(vmax)) if not hex_nonzero.empty else 1
         norm = TwoSlopeNorm(vmin=-abs_max, vcenter=0, vmax=abs_max)
     else:
         norm = None  # No diverging normalization for totals
 
-    # Plot non-zero hexes
-    hex_nonzero.plot(
-        ax=ax,
-        column="transactions_sum",
+    # Plot non-zero hexes as a single raster
+    image = _rasterize_hexes(
+        ax,
+        hex_nonzero,
+        "transactions_sum",
+        hexgrid_clipped.total_bounds,
         cmap=cmap,
-        edgecolor="grey",
-        linewidth=0.2,
-        legend=True,
-        cax=cax,
         norm=norm
     )
+    if image is None:
+        image = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+    fig.colorbar(image, cax=cax)
 
     boroughs.boundary.plot(ax=ax, color="black", linewidth=1)
 
     # Borough labels
-    for idx, row in boroughs.iterrows():
-        centroid = row.geometry.centroid
+    for x, y, name in _borough_labels(boroughs_path, crs_wkt):
         ax.text(
-            centroid.x,
-            centroid.y,
-            row["BOROUGH"],
+            x,
+            y,
+            name,
             fontsize=8,
             ha="center",
             va="center"
@@ -230,35 +374,39 @@ def facet_transaction_heatmaps_by_year(
     axes = axes.flatten()
 
     # Load boroughs
-    boroughs = gpd.read_file(boroughs_path).to_crs(hexgrid.crs)
+    crs_wkt = hexgrid.crs.to_wkt()
+    boroughs = _load_boroughs(boroughs_path, crs_wkt)
+    boroughs_union = _load_boroughs_union(boroughs_path, crs_wkt)
 
     # Normalize color scale across all years
     vmax = max(gdf[f"transactions_{y}"].max() for y in years)
     norm = Normalize(vmin=0, vmax=vmax)
 
+    # Spatial join and clip once; only the per-year aggregation changes inside the loop
+    year_cols = [f"transactions_{y}" for y in years]
+    gdf = align_to(gdf, hexgrid.crs)
+    joined = _join_to_hexgrid(gdf, hexgrid, year_cols)
+    grouped = joined.groupby("index_right")
+    hexgrid_clipped = gpd.clip(hexgrid, boroughs_union)
+
     for i, year in enumerate(years):
         ax = axes[i]
         col_name = f"transactions_{year}"
 
-        gdf_filtered = gdf[gdf[col_name] > 0]
-        joined = gpd.sjoin(gdf_filtered, hexgrid, how="left", predicate="within")
-        agg = joined.groupby("index_right")[col_name].sum()
-
-        hexgrid_plot = hexgrid.copy()
-        hexgrid_plot["transactions_sum"] = agg
-        hexgrid_plot["transactions_sum"] = hexgrid_plot["transactions_sum"].fillna(0)
+        agg = grouped[col_name].sum()
+        hexgrid_clipped["transactions_sum"] = agg
+        hexgrid_clipped["transactions_sum"] = hexgrid_clipped["transactions_sum"].fillna(0)
 
-        hexgrid_clipped = gpd.clip(hexgrid_plot, boroughs)
         hex_zero = hexgrid_clipped[hexgrid_clipped["transactions_sum"] == 0]
         hex_nonzero = hexgrid_clipped[hexgrid_clipped["transactions_sum"] > 0]
 
         hex_zero.plot(ax=ax, facecolor="none", edgecolor="lightgrey", linewidth=0.2)
-        hex_nonzero.plot(
-            ax=ax,
-            column="transactions_sum",
+        _rasterize_hexes(
+            ax,
+            hex_nonzero,
+            "transactions_sum",
+            hexgrid_clipped.total_bounds,
             cmap=cmap,
-            edgecolor="grey",
-            linewidth=0.2,
             norm=norm
         )
 
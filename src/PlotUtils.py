@@ -1,5 +1,6 @@
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 
 def plot_transaction_volume_with_annotations(df):
     """
@@ -8,14 +9,24 @@ def plot_transaction_volume_with_annotations(df):
     """
 
     # Ensure datetime format
-    df['transfer_date'] = pd.to_datetime(df['transfer_date'], errors='coerce')
+    df['transfer_date'] = pd.to_datetime(df['transfer_date'], format='ISO8601', errors='coerce', cache=True)
 
-    # Create month-year
-    df['month_year'] = df['transfer_date'].dt.to_period('M').dt.to_timestamp()
+    # Create month-year (truncate to month in numpy)
+    df['month_year'] = df['transfer_date'].to_numpy().astype('datetime64[M]').astype('datetime64[ns]')
 
     # Aggregate and calculate 3-month moving average
-    monthly_counts = df.groupby('month_year').size().reset_index(name='transaction_count')
-    monthly_counts['ma_3m'] = monthly_counts['transaction_count'].rolling(window=3).mean()
+    monthly_counts = (
+        df['month_year']
+        .value_counts()
+        .sort_index()
+        .rename_axis('month_year')
+        .reset_index(name='transaction_count')
+    )
+    counts = monthly_counts['transaction_count'].to_numpy(dtype=np.float64)
+    cumsum = np.concatenate(([0.0], np.cumsum(counts)))
+    ma_3m = np.full(len(counts), np.nan)  # first two months have no full window
+    ma_3m[2:] = (cumsum[3:] - cumsum[:-3]) / 3.0
+    monthly_counts['ma_3m'] = ma_3m
 
     # Build figure manually
     fig = go.Figure()